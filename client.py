@@ -0,0 +1,121 @@
+"""Elevator Simulation - Simulation Client
+
+=== Module description ===
+This module contains the client for the simulation service in service.py.
+It keeps its connections to the service open between jobs, so submitting a
+job costs a round trip rather than a new Python process. It imports neither
+pygame nor the simulation itself.
+
+    async with SimulationClient(path='/tmp/elevators.sock') as client:
+        stats = await client.run(config, seed=148, rounds=15)
+
+See service.py for the format of config.
+"""
+import asyncio
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class SimulationClient:
+    """A client submitting jobs to a simulation service over a pool of
+    reusable connections.
+
+    Up to pool_size jobs run at the same time; further jobs wait for a
+    connection to become free.
+
+    === Attributes ===
+    path: the Unix socket of the service, or None to use host and port
+    host: the host of the service
+    port: the port of the service
+    pool_size: the maximum number of connections open at once
+
+    === Private Attributes ===
+    _idle: the open connections not running a job
+    _slots: limits the number of connections to pool_size
+    """
+    path: Optional[str]
+    host: str
+    port: int
+    pool_size: int
+    _idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]
+    _slots: asyncio.Semaphore
+
+    def __init__(self, path: Optional[str] = None, host: str = '127.0.0.1',
+                 port: int = 8148, pool_size: int = 4) -> None:
+        self.path = path
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self._idle = []
+        self._slots = asyncio.Semaphore(pool_size)
+
+    async def __aenter__(self) -> 'SimulationClient':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def run(self, config: Dict[str, Any], seed: Optional[int] = None,
+                  rounds: int = 15,
+                  on_round: Optional[Callable[[int, Dict[str, Any]], None]]
+                  = None) -> Dict[str, Any]:
+        """Run a simulation job on the service, and return its statistics.
+
+        If on_round is given, it is called with the round number and the
+        statistics so far as the service reports each round.
+
+        Raise RuntimeError if the service reports that the job failed.
+        """
+        job = json.dumps({'config': config, 'seed': seed, 'rounds': rounds})
+        async with self._slots:
+            reader, writer = await self._acquire()
+            try:
+                writer.write(job.encode() + b'\n')
+                await writer.drain()
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        raise ConnectionError('service closed the connection')
+                    message = json.loads(line)
+                    if 'round' in message:
+                        if on_round is not None:
+                            on_round(message['round'], message['stats'])
+                    else:
+                        break
+            except BaseException:
+                writer.close()
+                raise
+            if 'error' in message:
+                # The service may have closed the connection after an error.
+                writer.close()
+                raise RuntimeError(message['error'])
+            self._idle.append((reader, writer))
+
+        return message['stats']
+
+    async def close(self) -> None:
+        """Close every idle connection."""
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+            await writer.wait_closed()
+
+    async def _acquire(self) -> Tuple[asyncio.StreamReader,
+                                      asyncio.StreamWriter]:
+        """Return an idle connection, or open a new one if there is none."""
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer
+            writer.close()
+        if self.path is not None:
+            return await asyncio.open_unix_connection(self.path)
+        return await asyncio.open_connection(self.host, self.port)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['asyncio', 'json'],
+        'max-nested-blocks': 4
+    })
@@ -0,0 +1,400 @@
+"""Elevator Simulation - Simulation Service
+
+=== Module description ===
+This module contains a long-lived local service that runs simulation jobs.
+Start it once, and planning tools can submit jobs to it (see client.py)
+instead of starting a new Python process, and importing pygame, for every run.
+
+The service listens on a Unix socket or on a localhost TCP port. Each job is
+one line of JSON:
+
+    {"config": {...}, "seed": 148, "rounds": 15}
+
+config is a simulation configuration (see Simulation) in which the arrival
+generator and the moving algorithm are given by name, since objects cannot be
+sent as JSON:
+
+    'arrival_generator': {'name': 'RandomArrivals', 'num_people': 2}
+    'arrival_generator': {'name': 'FileArrivals', 'filename': 'sample.csv'}
+    'moving_algorithm': 'ShortSighted'
+
+FileArrivals is only available if the service was started with a data
+directory, and only reads files inside it.
+
+The floors of a bank are given as a list of floor numbers. Jobs are never
+visualized.
+
+The service answers with one line of JSON per round, {"round": i, "stats":
+{...}}, and then either {"done": true, "stats": {...}} or {"error": "..."}.
+A connection can run any number of jobs, one after the other. A job is
+cancelled if its client goes away before it is done.
+"""
+import argparse
+import asyncio
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import itertools
+import json
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import algorithms
+from simulation import Simulation
+
+# The number of jobs that can be cancelled at the same time. Job job_id is
+# cancelled when slot job_id % CANCEL_SLOTS of the cancel array holds job_id.
+CANCEL_SLOTS = 4096
+
+# How often, in seconds, a worker process reports the rounds it has run.
+REPORT_INTERVAL = 0.05
+
+# What each worker process gets from the service, set by _init_worker.
+_worker_state: Dict[str, Any] = {}
+
+
+def build_config(spec: Dict[str, Any],
+                 data_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Return the simulation configuration described by the JSON spec.
+
+    FileArrivals may only read files inside data_dir.
+
+    Raise ValueError if spec names an unknown arrival generator or moving
+    algorithm, or an arrivals file that cannot be read.
+    """
+    config = dict(spec)
+    arrivals = spec['arrival_generator']
+    if arrivals['name'] == 'RandomArrivals':
+        config['arrival_generator'] = algorithms.RandomArrivals(
+            spec['num_floors'], arrivals['num_people'])
+    elif arrivals['name'] == 'FileArrivals':
+        config['arrival_generator'] = _file_arrivals(
+            spec['num_floors'], str(arrivals['filename']), data_dir)
+    else:
+        raise ValueError('unknown arrival generator: ' + str(arrivals['name']))
+
+    moving_algorithm = getattr(algorithms, str(spec['moving_algorithm']), None)
+    if not isinstance(moving_algorithm, type) or \
+            not issubclass(moving_algorithm, algorithms.MovingAlgorithm) or \
+            moving_algorithm is algorithms.MovingAlgorithm:
+        raise ValueError('unknown moving algorithm: ' +
+                         str(spec['moving_algorithm']))
+    config['moving_algorithm'] = moving_algorithm()
+    config['visualize'] = False
+    return config
+
+
+def _file_arrivals(max_floor: int, filename: str,
+                   data_dir: Optional[str]) -> algorithms.FileArrivals:
+    """Return the FileArrivals reading filename, relative to data_dir.
+
+    Raise ValueError if there is no data_dir, if filename is outside it, or
+    if it cannot be read. The error does not say what was in the file.
+    """
+    if data_dir is None:
+        raise ValueError('FileArrivals needs the service to have a data '
+                         'directory')
+    root = os.path.realpath(data_dir)
+    path = os.path.realpath(os.path.join(root, filename))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError('arrivals file outside the data directory: ' +
+                         filename)
+    try:
+        return algorithms.FileArrivals(max_floor, path)
+    except (OSError, ValueError):
+        raise ValueError('cannot read arrivals file: ' + filename) from None
+
+
+class _Cancelled(Exception):
+    """Raised in a worker process to stop a job that was cancelled."""
+
+
+def _init_worker(progress: Any, cancelled: Any,
+                 data_dir: Optional[str]) -> None:
+    """Keep what a new worker process gets from the service.
+
+    progress is the queue to report on, cancelled the cancel array, and
+    data_dir the directory of the arrivals files.
+    """
+    _worker_state.update(progress=progress, cancelled=cancelled,
+                         data_dir=data_dir)
+
+
+def _warm_up() -> int:
+    """Do nothing; submitted at start-up so every worker process is started,
+    and has imported the simulation, before the first job arrives.
+    """
+    return os.getpid()
+
+
+def _run_job(job_id: int, job: Dict[str, Any]) -> None:
+    """Run one job in a worker process.
+
+    The messages for the job, including the final one, are put on the
+    progress queue as (job_id, messages) pairs, at most every
+    REPORT_INTERVAL seconds. The job stops after the current round once it
+    is cancelled.
+    """
+    progress = _worker_state['progress']
+    cancelled = _worker_state['cancelled']
+    pending = []
+    last_report = time.monotonic()
+
+    def on_round(round_num: int, round_stats: Dict[str, Any]) -> None:
+        nonlocal last_report
+        if cancelled[job_id % CANCEL_SLOTS] == job_id:
+            raise _Cancelled()
+        pending.append({'round': round_num, 'stats': round_stats})
+        if time.monotonic() - last_report >= REPORT_INTERVAL:
+            progress.put((job_id, pending[:]))
+            pending.clear()
+            last_report = time.monotonic()
+
+    try:
+        random.seed(job.get('seed'))
+        sim = Simulation(build_config(job['config'],
+                                      _worker_state['data_dir']))
+        stats = sim.run(job['rounds'], on_round)
+        progress.put((job_id, pending + [{'done': True, 'stats': stats}]))
+    except _Cancelled:
+        pass
+    except Exception as error:
+        progress.put((job_id, pending + [{'error': repr(error)}]))
+
+
+class SimulationService:
+    """A local service running simulation jobs on a pool of worker processes.
+
+    === Attributes ===
+    num_workers: the number of worker processes, or None for one per core
+    data_dir: the directory FileArrivals jobs may read, or None if they may
+              not read any file
+
+    === Private Attributes ===
+    _pool: the worker processes, or None before the service starts
+    _progress: the queue the workers report progress on, or None before the
+               service starts
+    _cancelled: the cancel array shared with the workers
+    _jobs: the messages of every running job, keyed by job id
+    _clients: the task serving every client, keyed by its connection
+    _job_ids: the ids to give new jobs
+    _loop: the event loop of the service
+    """
+    num_workers: Optional[int]
+    data_dir: Optional[str]
+    _pool: Optional[ProcessPoolExecutor]
+    _progress: Any
+    _cancelled: Any
+    _jobs: Dict[int, asyncio.Queue]
+    _clients: Dict[asyncio.StreamWriter, asyncio.Task]
+    _job_ids: Any
+    _loop: asyncio.AbstractEventLoop
+
+    def __init__(self, num_workers: Optional[int] = None,
+                 data_dir: Optional[str] = None) -> None:
+        self.num_workers = num_workers
+        self.data_dir = data_dir
+        self._pool = None
+        self._progress = None
+        self._cancelled = RawArray('q', [-1] * CANCEL_SLOTS)
+        self._jobs = {}
+        self._clients = {}
+        self._job_ids = itertools.count()
+
+    async def serve(self, path: Optional[str] = None,
+                    host: str = '127.0.0.1', port: int = 8148) -> None:
+        """Serve jobs on the Unix socket at path, or on host and port if no
+        path is given, until cancelled.
+        """
+        self._loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(*[asyncio.wrap_future(future)
+                                   for future in self._start_pool()])
+            if path is not None:
+                server = await asyncio.start_unix_server(self._handle, path)
+            else:
+                server = await asyncio.start_server(self._handle, host, port)
+            async with server:
+                try:
+                    # Not server.serve_forever(), which from Python 3.12 on
+                    # waits for every connection to close when cancelled.
+                    await self._loop.create_future()
+                finally:
+                    await self._disconnect()
+        finally:
+            for job_id in self._jobs:
+                self._cancel(job_id)
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            if self._progress is not None:
+                self._progress.put(None)
+
+    async def _disconnect(self) -> None:
+        """Cancel every running job and close every connection, then wait a
+        little for the tasks serving the clients to end.
+        """
+        for job_id in list(self._jobs):
+            self._cancel(job_id)
+            self._deliver(job_id, {'error': 'the service stopped'})
+        for writer in self._clients:
+            writer.close()
+        if self._clients:
+            await asyncio.wait(list(self._clients.values()), timeout=1)
+
+    def _start_pool(self) -> List[Future]:
+        """Start a new pool of worker processes, with a new progress queue,
+        and return the warm-up tasks that start each of them.
+        """
+        self._progress = multiprocessing.Queue()
+        threading.Thread(target=self._dispatch, args=(self._progress,),
+                         daemon=True).start()
+        self._pool = ProcessPoolExecutor(
+            self.num_workers, initializer=_init_worker,
+            initargs=(self._progress, self._cancelled, self.data_dir))
+        num_workers = self.num_workers or os.cpu_count() or 1
+        return [self._pool.submit(_warm_up) for _ in range(num_workers)]
+
+    def _submit(self, job_id: int, job: Dict[str, Any]) -> Future:
+        """Submit job to the worker processes, replacing the pool first if a
+        worker process has died.
+
+        The progress queue is replaced too, since the dead process may have
+        died while writing to it.
+        """
+        try:
+            return self._pool.submit(_run_job, job_id, job)
+        except BrokenProcessPool:
+            self._pool.shutdown(wait=False)
+            self._progress.put(None)
+            self._start_pool()
+            return self._pool.submit(_run_job, job_id, job)
+
+    def _cancel(self, job_id: int) -> None:
+        """Tell the worker process running job_id to stop it."""
+        self._cancelled[job_id % CANCEL_SLOTS] = job_id
+
+    def _dispatch(self, progress: Any) -> None:
+        """Hand every message the workers report on progress to the job it
+        belongs to.
+
+        This runs in its own thread, since reading the queue blocks.
+        """
+        while True:
+            item = progress.get()
+            if item is None:
+                break
+            job_id, messages = item
+            self._loop.call_soon_threadsafe(self._deliver, job_id, *messages)
+
+    def _deliver(self, job_id: int, *messages: Dict[str, Any]) -> None:
+        """Pass messages on to job_id, if the job is still running."""
+        if job_id in self._jobs:
+            for message in messages:
+                self._jobs[job_id].put_nowait(message)
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter) -> None:
+        """Run the jobs sent over one connection until the client hangs up.
+
+        Any failure is reported to the client as an error line, after which
+        the connection is closed.
+        """
+        self._clients[writer] = asyncio.current_task()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    job = json.loads(line)
+                except ValueError as error:
+                    await self._send(writer, {'error': repr(error)})
+                    continue
+                await self._run(job, writer)
+        except ConnectionError:
+            pass
+        except Exception as error:
+            # For example, a line longer than the stream limit.
+            try:
+                await self._send(writer, {'error': repr(error)})
+            except ConnectionError:
+                pass
+        finally:
+            del self._clients[writer]
+            writer.close()
+
+    async def _run(self, job: Dict[str, Any],
+                   writer: asyncio.StreamWriter) -> None:
+        """Submit job to the worker processes and stream its messages back.
+
+        If the client goes away first, the job is cancelled.
+        """
+        job_id = next(self._job_ids)
+        messages = asyncio.Queue()
+        self._jobs[job_id] = messages
+        done = False
+        try:
+            future = self._submit(job_id, job)
+            future.add_done_callback(lambda result: self._lost(job_id, result))
+            while not done:
+                # Send every message that has arrived in one write.
+                batch = [await messages.get()]
+                while not messages.empty() and 'round' in batch[-1]:
+                    batch.append(messages.get_nowait())
+                done = 'round' not in batch[-1]
+                await self._send(writer, *batch)
+        finally:
+            if not done:
+                self._cancel(job_id)
+            del self._jobs[job_id]
+
+    def _lost(self, job_id: int, future: Future) -> None:
+        """Report job_id as failed if its worker process died without
+        reporting back.
+        """
+        if self._loop.is_closed() or \
+                not future.cancelled() and future.exception() is None:
+            return
+        message = {'error': 'worker lost: ' + repr(
+            None if future.cancelled() else future.exception())}
+        self._loop.call_soon_threadsafe(self._deliver, job_id, message)
+
+    async def _send(self, writer: asyncio.StreamWriter,
+                    *messages: Dict[str, Any]) -> None:
+        """Write each message to writer as one line of JSON."""
+        writer.write(b''.join(json.dumps(message).encode() + b'\n'
+                              for message in messages))
+        await writer.drain()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run simulation jobs.')
+    parser.add_argument('--path', help='serve on this Unix socket')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8148)
+    parser.add_argument('--workers', type=int,
+                        help='number of worker processes (default: one per '
+                             'core)')
+    parser.add_argument('--data-dir',
+                        help='directory of the files FileArrivals jobs may '
+                             'read (default: none)')
+    args = parser.parse_args()
+    try:
+        asyncio.run(SimulationService(args.workers, args.data_dir).serve(
+            args.path, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['algorithms', 'simulation', 'argparse', 'asyncio',
+                          'concurrent.futures', 'concurrent.futures.process',
+                          'itertools', 'json', 'multiprocessing',
+                          'multiprocessing.sharedctypes', 'os', 'random',
+                          'threading', 'time'],
+        'max-nested-blocks': 4
+    })
@@ -14,9 +14,12 @@ Note that we have provided a fairly comprehensive list of attributes for
 Simulation already. You may add your own *private* attributes, but should not
 remove any of the existing attributes.
 """
-# You may import more things from these modules (e.g., additional types from
-# typing), but you may not import from any other modules.
-from typing import Dict, List, Any
+# Apart from multiprocessing, which runs the banks of a building in parallel,
+# only import from these modules.
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+import random
+from typing import Callable, Dict, List, Any, Optional, Tuple
 
 import algorithms
 from algorithms import Direction
@@ -37,6 +40,20 @@ class Simulation:
              (keys are floor numbers, values are the list of waiting people)
     stats: a dictionary of the statistics of the simulation. (key are the date
     name, values are the date)
+
+    === Banks ===
+    If config has a 'banks' key, the building is split into independent
+    elevator banks. Each bank is a dictionary with a 'floors' key (the floor
+    numbers the bank serves, e.g. a range) and a 'num_elevators' key. Every
+    arrival goes to the first bank serving both its start and target floor.
+    People no bank can serve are counted in total_people and in an extra
+    'unserved' statistic, and never complete.
+    Each bank runs in its own worker process, all of them stepping through
+    the rounds together, and their statistics are merged after every round.
+    The elevators of a bank start at its lowest floor and stay between its
+    lowest and highest floor. In that case config['num_elevators'] is
+    ignored, self.elevators is empty (the elevators live in the workers) and
+    nothing is visualized.
     """
     arrival_generator: algorithms.ArrivalGenerator
     elevators: List[Elevator]
@@ -45,27 +62,42 @@ class Simulation:
     visualizer: Visualizer
     waiting: Dict[int, List[Person]]
     stats: Dict
+    _banks: List[Dict[str, Any]]
+    _config: Dict[str, Any]
+    _lowest_floor: int
 
     def __init__(self,
-                 config: Dict[str, Any]) -> None:
-        """Initialize a new simulation using the given configuration."""
+                 config: Dict[str, Any], *, lowest_floor: int = 1) -> None:
+        """Initialize a new simulation using the given configuration.
+
+        lowest_floor is only set for the simulation of a bank, whose elevators
+        start at and never go below that floor.
+        """
 
         # Initialize the visualizer.
         # Note that this should be called *after* the other attributes
         # have been initialized.
+        self._banks = config.get('banks', [])
+        self._config = config
+        self._lowest_floor = lowest_floor
+        for bank in self._banks:
+            _check_bank(bank, config['num_floors'])
         self.elevators = []
-        for i in range(config['num_elevators']):
-            self.elevators.append(Elevator([], 1, config['elevator_capacity']))
+        if not self._banks:
+            for i in range(config['num_elevators']):
+                self.elevators.append(Elevator([], self._lowest_floor,
+                                               config['elevator_capacity']))
         self.arrival_generator = config['arrival_generator']
         self.moving_algorithm = config['moving_algorithm']
         self.waiting = {}
-        for i in range(config['num_floors']):
-            self.waiting[i+1] = []
+        for i in range(self._lowest_floor, config['num_floors'] + 1):
+            self.waiting[i] = []
         self.num_floors = config['num_floors']
         self.visualizer = Visualizer(self.elevators,  # should be self.elevators
                                      config['num_floors'],
                                      # should be self.num_floors
-                                     config['visualize'])
+                                     config['visualize'] and
+                                     not self._banks)
         self.stats = {
             'num_iterations': 0,
             'total_people': 0,
@@ -74,50 +106,92 @@ class Simulation:
             'min_time': -1,
             'avg_time': -1
         }
+        if self._banks:
+            self.stats['unserved'] = 0
 
     ############################################################################
     # Handle rounds of simulation.
     ############################################################################
-    def run(self, num_rounds: int) -> Dict[str, Any]:
+    def run(self, num_rounds: int,
+            on_round: Optional[Callable[[int, Dict[str, Any]], None]] = None
+            ) -> Dict[str, Any]:
         """Run the simulation for the given number of rounds.
 
         Return a set of statistics for this simulation run, as specified in the
         assignment handout.
 
+        If on_round is given, it is called after every round with the round
+        number and the statistics so far.
+
         Precondition: num_rounds >= 1.
 
         Note: each run of the simulation starts from the same initial state
-        (no people, all elevators are empty and start at floor 1).
+        (no people, all elevators are empty and start at floor 1, or at the
+        lowest floor of their bank).
 
         """
+        if self._banks:
+            return self._run_banks(num_rounds, on_round)
+
         for i in range(num_rounds):
+            self._run_round(i)
+            if on_round is not None:
+                on_round(i, self._calculate_stats())
 
-            self.visualizer.render_header(i)
+        return self._calculate_stats()
 
-            # Stage 1: generate new arrivals
-            self._generate_arrivals(i)
+    def step(self, round_num: int,
+             arrivals: List[Tuple[int, int]]) -> Dict[str, Any]:
+        """Run round round_num of the simulation, in which the people with the
+        given (start, target) floors arrive instead of those from
+        arrival_generator. Return the statistics so far.
 
-            # Stage 2: leave elevators
-            self._handle_leaving()
+        This is how the simulation of a bank is run.
+        """
+        new_passenger = {}
+        for start, target in arrivals:
+            new_passenger.setdefault(start, []).append(Person(start, target))
+        self._run_round(round_num, new_passenger)
+        return self._calculate_stats()
 
-            # Stage 3: board elevators
-            self._handle_boarding()
+    def _run_round(self, round_num: int,
+                   new_passenger: Optional[Dict[int, List[Person]]] = None
+                   ) -> None:
+        """Run one round of the simulation.
 
-            # Stage 4: move the elevators using the moving algorithm
-            self._move_elevators()
+        If new_passenger is given, those people arrive instead of the ones
+        from arrival_generator.
+        """
+        self.visualizer.render_header(round_num)
 
-            # Pause for 1 second
-            self.visualizer.wait(1)
+        # Stage 1: generate new arrivals
+        if new_passenger is None:
+            self._generate_arrivals(round_num)
+        else:
+            self._add_arrivals(new_passenger)
 
-            self._update_wait_time()
+        # Stage 2: leave elevators
+        self._handle_leaving()
 
-            self.stats['num_iterations'] += 1
+        # Stage 3: board elevators
+        self._handle_boarding()
 
-        return self._calculate_stats()
+        # Stage 4: move the elevators using the moving algorithm
+        self._move_elevators()
+
+        # Pause for 1 second
+        self.visualizer.wait(1)
+
+        self._update_wait_time()
+
+        self.stats['num_iterations'] += 1
 
     def _generate_arrivals(self, round_num: int) -> None:
         """Generate and visualize new arrivals."""
-        new_passenger = self.arrival_generator.generate(round_num)
+        self._add_arrivals(self.arrival_generator.generate(round_num))
+
+    def _add_arrivals(self, new_passenger: Dict[int, List[Person]]) -> None:
+        """Add and visualize the given new arrivals."""
         for key in new_passenger:
             self.waiting[key].extend(new_passenger[key])
             self.stats['total_people'] += len(new_passenger[key])
@@ -156,6 +230,10 @@ class Simulation:
         direction = self.moving_algorithm.move_elevators(self.elevators,
                                                          self.waiting,
                                                          self.num_floors)
+        for i, elevator in enumerate(self.elevators):
+            if direction[i] == Direction.DOWN and \
+                    elevator.floor == self._lowest_floor:
+                direction[i] = Direction.STAY
         self.visualizer.show_elevator_moves(self.elevators, direction)
 
         for i in range(len(self.elevators)):
@@ -178,13 +256,98 @@ class Simulation:
             for passenger in elevator.passengers:
                 passenger.wait_time += 1
 
+    ############################################################################
+    # Handle rounds of a simulation split into banks.
+    ############################################################################
+    def _run_banks(self, num_rounds: int,
+                   on_round: Optional[Callable[[int, Dict[str, Any]], None]]
+                   ) -> Dict[str, Any]:
+        """Run the simulation for the given number of rounds, with every bank
+        simulated in its own worker process.
+
+        Each worker is seeded from random, so seeding random makes the run
+        reproducible. Each round, the new arrivals are routed to their banks,
+        every worker simulates that round, and the parent waits for all of
+        them before merging their statistics into self.stats.
+        """
+        connections = []
+        workers = []
+        unserved = 0
+        try:
+            for bank in self._banks:
+                bank_config = dict(self._config)
+                del bank_config['banks']
+                bank_config['num_elevators'] = bank['num_elevators']
+                bank_config['num_floors'] = max(bank['floors'])
+                bank_config['arrival_generator'] = None
+                bank_config['visualize'] = False
+                parent_end, child_end = Pipe()
+                worker = Process(target=_bank_worker,
+                                 args=(child_end, bank_config,
+                                       min(bank['floors']),
+                                       random.getrandbits(32)))
+                worker.start()
+                child_end.close()
+                connections.append(parent_end)
+                workers.append(worker)
+
+            for i in range(num_rounds):
+                routed = [[] for _ in self._banks]
+                new_passenger = self.arrival_generator.generate(i)
+                for key in new_passenger:
+                    for person in new_passenger[key]:
+                        bank = self._route(person)
+                        if bank is None:
+                            unserved += 1
+                        else:
+                            routed[bank].append((person.start, person.target))
+
+                for index, connection in enumerate(connections):
+                    try:
+                        connection.send((i, routed[index]))
+                    except OSError:
+                        # The worker has stopped; its reply says why.
+                        pass
+                bank_stats = [_receive(connection)
+                              for connection in connections]
+                for stats in bank_stats:
+                    if isinstance(stats, BaseException):
+                        raise stats
+                self.stats = _merge_stats(bank_stats, unserved)
+                if on_round is not None:
+                    on_round(i, self._calculate_stats())
+        finally:
+            for connection in connections:
+                try:
+                    connection.send(None)
+                except OSError:
+                    pass
+                connection.close()
+            for worker in workers:
+                worker.join(1)
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+
+        return self._calculate_stats()
+
+    def _route(self, person: Person) -> Optional[int]:
+        """Return the index of the first bank serving both the start and the
+        target floor of person, or None if no bank serves that trip.
+        """
+        for index, bank in enumerate(self._banks):
+            if person.start in bank['floors'] and \
+                    person.target in bank['floors']:
+                return index
+        return None
+
     ############################################################################
     # Statistics calculations
     ############################################################################
-    def _calculate_stats(self) -> Dict[str, int]:
+    def _calculate_stats(self) -> Dict[str, Any]:
         """Report the statistics for the current run of this simulation.
         """
-        return {
+        stats = {
             'num_iterations': self.stats['num_iterations'],
             'total_people': self.stats['total_people'],
             'people_completed': self.stats['people_completed'],
@@ -192,6 +355,9 @@ class Simulation:
             'min_time': self.stats['min_time'],
             'avg_time': self.stats['avg_time']
         }
+        if self._banks:
+            stats['unserved'] = self.stats['unserved']
+        return stats
 
     def _update_stats(self, finish_time: int) -> None:
         """Update stats when a person leaves. Always update people_completed and
@@ -213,6 +379,86 @@ class Simulation:
                                   finish_time) / self.stats['people_completed']
 
 
+def _check_bank(bank: Dict[str, Any], num_floors: int) -> None:
+    """Raise ValueError unless bank is a valid bank of a building with
+    num_floors floors.
+    """
+    if 'floors' not in bank or 'num_elevators' not in bank:
+        raise ValueError('a bank needs floors and num_elevators: ' + str(bank))
+    if len(bank['floors']) == 0 or \
+            not all(1 <= floor <= num_floors for floor in bank['floors']):
+        raise ValueError('bank floors must be between 1 and ' +
+                         str(num_floors) + ': ' + str(bank['floors']))
+    if bank['num_elevators'] < 1:
+        raise ValueError('a bank needs at least one elevator: ' + str(bank))
+
+
+def _bank_worker(connection: Connection, config: Dict[str, Any],
+                 lowest_floor: int, seed: int) -> None:
+    """Simulate one bank, a round at a time, in a worker process.
+
+    The bank's floors run from lowest_floor to config['num_floors'], and its
+    random numbers are seeded with seed.
+
+    Each message received is a (round number, arrivals) pair, answered with the
+    bank's statistics once that round is done. None ends the worker. If the
+    simulation fails, the error is sent instead and the worker ends.
+    """
+    try:
+        random.seed(seed)
+        sim = Simulation(config, lowest_floor=lowest_floor)
+        message = connection.recv()
+        while message is not None:
+            connection.send(sim.step(*message))
+            message = connection.recv()
+    except EOFError:
+        pass
+    except Exception as error:
+        try:
+            connection.send(error)
+        except Exception:
+            # The error itself could not be pickled.
+            connection.send(RuntimeError(repr(error)))
+    finally:
+        connection.close()
+
+
+def _receive(connection: Connection) -> Any:
+    """Return the next reply of a bank worker, or an error if the worker
+    stopped without replying.
+    """
+    try:
+        return connection.recv()
+    except EOFError:
+        return RuntimeError('a bank worker stopped unexpectedly')
+
+
+def _merge_stats(bank_stats: List[Dict[str, Any]],
+                 unserved: int) -> Dict[str, Any]:
+    """Merge the statistics of every bank into those of the whole building.
+
+    unserved is the number of people that no bank could serve.
+    """
+    completed = [stats for stats in bank_stats if stats['people_completed']]
+    people_completed = sum(stats['people_completed'] for stats in completed)
+    merged = {
+        'num_iterations': bank_stats[0]['num_iterations'],
+        'total_people': unserved + sum(stats['total_people']
+                                       for stats in bank_stats),
+        'people_completed': people_completed,
+        'max_time': -1,
+        'min_time': -1,
+        'avg_time': -1,
+        'unserved': unserved
+    }
+    if completed:
+        merged['max_time'] = max(stats['max_time'] for stats in completed)
+        merged['min_time'] = min(stats['min_time'] for stats in completed)
+        merged['avg_time'] = sum(stats['avg_time'] * stats['people_completed']
+                                 for stats in completed) / people_completed
+    return merged
+
+
 def sample_run() -> Dict[str, int]:
     """Run a sample simulation, and return the simulation statistics."""
     config = {
@@ -237,6 +483,8 @@ if __name__ == '__main__':
 
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['entities', 'visualizer', 'algorithms', 'time'],
+        'extra-imports': ['entities', 'visualizer', 'algorithms', 'time',
+                          'multiprocessing', 'multiprocessing.connection',
+                          'random'],
         'max-nested-blocks': 4
     })
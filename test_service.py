@@ -0,0 +1,114 @@
+"""Tests for the simulation service and its client."""
+import asyncio
+import json
+
+import pytest
+
+from client import SimulationClient
+from service import SimulationService
+
+CONFIG = {
+    'num_floors': 6,
+    'num_elevators': 2,
+    'elevator_capacity': 3,
+    'arrival_generator': {'name': 'RandomArrivals', 'num_people': 2},
+    'moving_algorithm': 'ShortSighted'
+}
+
+
+def _with_service(tmp_path, test, data_dir=None):
+    """Run the coroutine function test(path) against a service with one
+    worker process listening on the Unix socket at path.
+    """
+    path = str(tmp_path / 'service.sock')
+
+    async def main():
+        service = asyncio.create_task(
+            SimulationService(1, data_dir).serve(path))
+        while not (tmp_path / 'service.sock').exists():
+            assert not service.done()
+            await asyncio.sleep(0.05)
+        try:
+            await asyncio.wait_for(test(path), 30)
+        finally:
+            service.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await service
+
+    asyncio.run(main())
+
+
+def test_round_trip(tmp_path):
+    async def test(path):
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(json.dumps({'config': CONFIG, 'seed': 1,
+                                 'rounds': 5}).encode() + b'\n')
+        messages = [json.loads(await reader.readline()) for _ in range(6)]
+        writer.close()
+        assert [message.get('round') for message in messages] == \
+            [0, 1, 2, 3, 4, None]
+        assert messages[-1]['done']
+        assert messages[-1]['stats'] == messages[-2]['stats']
+        assert messages[-1]['stats']['num_iterations'] == 5
+
+    _with_service(tmp_path, test)
+
+
+def test_client_reuses_connection(tmp_path):
+    async def test(path):
+        async with SimulationClient(path=path, pool_size=1) as client:
+            rounds = []
+            first = await client.run(CONFIG, 1, 5,
+                                     lambda i, _: rounds.append(i))
+            connection = client._idle[0]
+            assert await client.run(CONFIG, 1, 5) == first
+            assert client._idle == [connection]
+            assert rounds == [0, 1, 2, 3, 4]
+
+    _with_service(tmp_path, test)
+
+
+def test_error_closes_client_connection(tmp_path):
+    async def test(path):
+        async with SimulationClient(path=path) as client:
+            with pytest.raises(RuntimeError, match='unknown moving algorithm'):
+                await client.run(dict(CONFIG, moving_algorithm='Elevator'))
+            assert client._idle == []
+            assert (await client.run(CONFIG, rounds=3))['num_iterations'] == 3
+
+    _with_service(tmp_path, test)
+
+
+def test_file_arrivals_stay_in_data_dir(tmp_path):
+    (tmp_path / 'arrivals.csv').write_text('0,1,4\n')
+    (tmp_path / 'secret.txt').write_text('not,a,number\n')
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    (data_dir / 'arrivals.csv').write_text('0,1,4\n')
+
+    async def test(path):
+        async with SimulationClient(path=path) as client:
+            stats = await client.run(dict(CONFIG, arrival_generator={
+                'name': 'FileArrivals', 'filename': 'arrivals.csv'}), rounds=5)
+            assert stats['people_completed'] == 1
+            for filename in ['../arrivals.csv', str(tmp_path / 'secret.txt')]:
+                with pytest.raises(RuntimeError, match='outside') as error:
+                    await client.run(dict(CONFIG, arrival_generator={
+                        'name': 'FileArrivals', 'filename': filename}))
+                assert 'number' not in str(error.value)
+
+    _with_service(tmp_path, test, str(data_dir))
+
+
+def test_disconnect_cancels_job(tmp_path):
+    async def test(path):
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(json.dumps({'config': CONFIG, 'seed': 1,
+                                 'rounds': 10 ** 9}).encode() + b'\n')
+        await reader.readline()
+        writer.close()
+        # The only worker process is free again once the job is cancelled.
+        async with SimulationClient(path=path) as client:
+            assert (await client.run(CONFIG, rounds=3))['num_iterations'] == 3
+
+    _with_service(tmp_path, test)
@@ -0,0 +1,109 @@
+"""Tests for the elevator banks of simulation.py."""
+import random
+
+import pytest
+
+import algorithms
+from entities import Person
+from simulation import Simulation, _check_bank, _merge_stats
+
+
+def _config(**changes):
+    """Return a small configuration, with the given changes."""
+    config = {
+        'num_floors': 10,
+        'num_elevators': 2,
+        'elevator_capacity': 3,
+        'arrival_generator': algorithms.RandomArrivals(10, 2),
+        'moving_algorithm': algorithms.ShortSighted(),
+        'visualize': False
+    }
+    config.update(changes)
+    return config
+
+
+def _stats(completed, avg_time=-1, max_time=-1, min_time=-1, total=0):
+    """Return the statistics of a bank after 5 rounds."""
+    return {'num_iterations': 5, 'total_people': total,
+            'people_completed': completed, 'max_time': max_time,
+            'min_time': min_time, 'avg_time': avg_time}
+
+
+def test_route():
+    sim = Simulation(_config(banks=[
+        {'floors': range(1, 6), 'num_elevators': 1},
+        {'floors': [1] + list(range(6, 11)), 'num_elevators': 1}]))
+    assert sim._route(Person(1, 5)) == 0
+    assert sim._route(Person(6, 1)) == 1
+    assert sim._route(Person(10, 7)) == 1
+    assert sim._route(Person(3, 8)) is None
+
+
+def test_merge_stats():
+    merged = _merge_stats([_stats(2, 4, 6, 2, total=3),
+                           _stats(1, 10, 10, 10, total=4)], 2)
+    assert merged == {'num_iterations': 5, 'total_people': 9,
+                      'people_completed': 3, 'max_time': 10, 'min_time': 2,
+                      'avg_time': 6, 'unserved': 2}
+
+
+def test_merge_stats_ignores_banks_without_completions():
+    merged = _merge_stats([_stats(0, total=3), _stats(1, 7, 7, 7, total=1)],
+                          0)
+    assert (merged['max_time'], merged['min_time'], merged['avg_time']) == \
+        (7, 7, 7)
+
+
+def test_merge_stats_nobody_completed():
+    merged = _merge_stats([_stats(0, total=2), _stats(0)], 1)
+    assert merged == {'num_iterations': 5, 'total_people': 3,
+                      'people_completed': 0, 'max_time': -1, 'min_time': -1,
+                      'avg_time': -1, 'unserved': 1}
+
+
+@pytest.mark.parametrize('bank', [
+    {'floors': range(1, 11)},
+    {'num_elevators': 1},
+    {'floors': [], 'num_elevators': 1},
+    {'floors': range(0, 5), 'num_elevators': 1},
+    {'floors': range(5, 12), 'num_elevators': 1},
+    {'floors': range(1, 11), 'num_elevators': 0},
+])
+def test_check_bank_errors(bank):
+    with pytest.raises(ValueError):
+        _check_bank(bank, 10)
+
+
+def test_bad_bank_rejected_before_running():
+    with pytest.raises(ValueError):
+        Simulation(_config(banks=[{'floors': range(1, 6), 'num_elevators': 1},
+                                  {'floors': range(5, 11)}]))
+
+
+@pytest.mark.parametrize('moving_algorithm', [algorithms.ShortSighted,
+                                              algorithms.PushyPassenger])
+def test_single_bank_matches_plain_run(tmp_path, moving_algorithm):
+    arrivals = tmp_path / 'arrivals.csv'
+    arrivals.write_text('0,1,4,2,7\n1,5,1\n2,9,3,10,1,6,2\n4,3,8\n6,1,10\n')
+
+    def run(**changes):
+        return Simulation(_config(
+            arrival_generator=algorithms.FileArrivals(10, str(arrivals)),
+            moving_algorithm=moving_algorithm(), **changes)).run(20)
+
+    plain = run()
+    banked = run(banks=[{'floors': range(1, 11), 'num_elevators': 2}])
+    assert banked.pop('unserved') == 0
+    assert banked == plain
+
+
+def test_banked_run_is_reproducible():
+    def run():
+        random.seed(148)
+        return Simulation(_config(
+            moving_algorithm=algorithms.RandomAlgorithm(),
+            banks=[{'floors': range(1, 6), 'num_elevators': 1},
+                   {'floors': [1] + list(range(6, 11)),
+                    'num_elevators': 1}])).run(30)
+
+    assert run() == run()